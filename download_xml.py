@@ -1,45 +1,184 @@
 import os
 import csv
+import json
+import threading
 import requests
 import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+MAX_WORKERS = 32  # Total number of concurrent downloads
+MAX_PER_HOST = 4  # Concurrent downloads against a single host
+CHUNK_SIZE = 1 << 16  # Bytes read from the socket per write
+CACHE_FILE = "cache.json"  # ETag/Last-Modified of earlier downloads, kept in the output directory
 
-def download_files(csv_path, output_dir):
+
+def create_session(pool_size=MAX_WORKERS):
+    """
+    Creates a requests session with keep-alive connection pooling and retries.
+
+    Parameters:
+    - pool_size (int): Maximum number of pooled connections per host.
+
+    Returns:
+    - requests.Session: The configured session.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=Retry(total=3, backoff_factor=0.5),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def load_cache(output_dir):
+    """
+    Loads the validators (ETag, Last-Modified) of earlier downloads.
+
+    Parameters:
+    - output_dir (str): Directory holding the downloaded files and the cache.
+
+    Returns:
+    - dict: Cache entries by file name; empty if there is no readable cache.
+    """
+    try:
+        with open(os.path.join(output_dir, CACHE_FILE), 'r', encoding='utf-8') as cache_file:
+            return json.load(cache_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_cache(output_dir, cache):
+    """
+    Stores the validators of the downloaded files for the next run.
+
+    Parameters:
+    - output_dir (str): Directory holding the downloaded files and the cache.
+    - cache (dict): Cache entries by file name.
+    """
+    with open(os.path.join(output_dir, CACHE_FILE), 'w', encoding='utf-8') as cache_file:
+        json.dump(cache, cache_file, indent=2)
+
+
+def _fetch(session, host_limit, cache, file_name, url, output_dir):
+    """
+    Downloads a single URL and streams the response body to disk.
+
+    The body is written in chunks to a temporary ``.part`` file which replaces the
+    output file only once the download has completed, so memory use stays bounded
+    by the chunk size and a failed transfer never leaves a truncated XML behind.
+
+    If the file is still on disk from an earlier run, the request is made conditional
+    on its ETag/Last-Modified and an unchanged file is not transferred again.
+
+    Parameters:
+    - session (requests.Session): Shared session used for the request.
+    - host_limit (threading.Semaphore): Limits concurrent requests to the URL's host.
+    - cache (dict): Cache entries by file name, updated with the response's validators.
+    - file_name (str): Name of the output file without extension.
+    - url (str): URL to download.
+    - output_dir (str): Directory where the downloaded file will be saved.
+    """
+    output_file = os.path.join(output_dir, f"{file_name}.xml")
+    partial_file = f"{output_file}.part"  # Renamed once the body is complete
+
+    headers = {}
+    entry = cache.get(file_name)
+    if entry and entry.get("url") == url and os.path.isfile(output_file) \
+            and os.path.getsize(output_file) == entry.get("size"):
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    print(f"Downloading {file_name} from {url}...")
+    start_time = time.time()
+    try:
+        with host_limit:
+            with session.get(url, headers=headers, stream=True, timeout=30) as response:
+                response.raise_for_status()  # Raise an error for bad HTTP status codes
+                if response.status_code == 304:
+                    print(f"{file_name} is not modified, keeping the existing file.")
+                    return
+                with open(partial_file, 'wb') as file:
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                        file.write(chunk)
+        os.replace(partial_file, output_file)
+        cache[file_name] = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "size": os.path.getsize(output_file),
+        }
+        elapsed_time = time.time() - start_time
+        print(f"Successfully downloaded {file_name}. Time taken: {elapsed_time:.2f} seconds.")
+    except (requests.exceptions.RequestException, OSError) as e:
+        try:
+            os.remove(partial_file)
+        except OSError:
+            pass  # Never created, e.g. the name is not a valid file name
+        print(f"Failed to download {file_name} from {url}. Error: {e}")
+
+
+def download_files(csv_path, output_dir, max_workers=MAX_WORKERS, max_per_host=MAX_PER_HOST):
     """
     Downloads files from URLs specified in a CSV file and saves them with custom names.
 
+    Downloads run concurrently on a thread pool sharing one keep-alive session,
+    with the number of parallel requests against a single host capped. Files
+    that are unchanged on the server since the last run are not downloaded again.
+
     Parameters:
     - csv_path (str): Path to the CSV file containing names and URLs.
     - output_dir (str): Directory where the downloaded files will be saved.
+    - max_workers (int): Total number of concurrent downloads.
+    - max_per_host (int): Maximum number of concurrent downloads against a single host.
     """
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    with open(csv_path, 'r', encoding='utf-8') as csv_file:
-        reader = csv.reader(csv_file)
-        next(reader, None)  # Skip the header row
-        for row in reader:
-            if len(row) < 2:
-                print(f"Skipping invalid row: {row}")
-                continue
-
-            file_name, url = row[0], row[1]
-            output_file = os.path.join(output_dir, f"{file_name}.xml")
-
-            print(f"Downloading {file_name} from {url}...")
-            start_time = time.time()
-            try:
-                response = requests.get(url, timeout=30)
-                response.raise_for_status()  # Raise an error for bad HTTP status codes
-                with open(output_file, 'wb') as file:
-                    file.write(response.content)
-                elapsed_time = time.time() - start_time
-                print(f"Successfully downloaded {file_name}. Time taken: {elapsed_time:.2f} seconds.")
-            except requests.exceptions.RequestException as e:
-                print(f"Failed to download {file_name} from {url}. Error: {e}")
+    cache = load_cache(output_dir)
+    host_limits = defaultdict(lambda: threading.Semaphore(max_per_host))
+    with create_session(max_workers) as session, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = []
+        file_names = set()  # Concurrent downloads must not share an output file
+        # Rows are submitted while the CSV is read, so downloads start with the first URL
+        with open(csv_path, 'r', encoding='utf-8', newline='') as csv_file:
+            reader = csv.reader(csv_file)
+            next(reader, None)  # Skip the header row
+            for row in reader:
+                if len(row) < 2:
+                    print(f"Skipping invalid row: {row}")
+                    continue
+                file_name, url = row[0], row[1]
+                if file_name in file_names:
+                    print(f"Skipping duplicate file name {file_name}: {url}")
+                    continue
+                file_names.add(file_name)
+                futures.append(executor.submit(_fetch, session, host_limits[urlparse(url).netloc], cache,
+                                               file_name, url, output_dir))
+        for future in as_completed(futures):
+            future.result()
+    save_cache(output_dir, cache)
 
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Download XML files from the URLs listed in a CSV file")
+    parser.add_argument('-w', '--workers', type=int, default=MAX_WORKERS, help='Total number of concurrent downloads.')
+    parser.add_argument('-p', '--per-host', type=int, default=MAX_PER_HOST, help='Maximum number of concurrent downloads per host.')
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.per_host < 1:
+        parser.error("--per-host must be at least 1")  # A zero semaphore would block every download
+
     CSV_PATH = "urls.csv"
     OUTPUT_DIR = "xml_files"
-    download_files(CSV_PATH, OUTPUT_DIR)
+    download_files(CSV_PATH, OUTPUT_DIR, args.workers, args.per_host)
@@ -1,5 +1,9 @@
 import re
 
+DATE_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+DATETIME_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}([+-]\d{2}:\d{2}|Z)?$")
+DECIMAL_PATTERN = re.compile(r"^\d+\.\d+$")
+
 
 def infer_type(text):
     """
@@ -22,16 +26,13 @@ def infer_type(text):
 
     cleaned_text = text.strip('\'"')
 
-    date_pattern = r"^\d{4}-\d{2}-\d{2}$"
-    datetime_pattern = r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}([+-]\d{2}:\d{2}|Z)?$"
-
-    if re.match(date_pattern, cleaned_text):
+    if DATE_PATTERN.match(cleaned_text):
         return "xs:date"
-    elif re.match(datetime_pattern, cleaned_text):
+    elif DATETIME_PATTERN.match(cleaned_text):
         return "xs:dateTime"
     elif cleaned_text.isdigit():
         return "xs:integer"
-    elif re.match(r"^\d+\.\d+$", cleaned_text):
+    elif DECIMAL_PATTERN.match(cleaned_text):
         return "xs:decimal"
     return "xs:string"
 
@@ -1,124 +1,338 @@
+import gc
+from itertools import count
+from types import SimpleNamespace
+from string import ascii_lowercase
+from xml.sax.saxutils import quoteattr
 from lxml import etree
-from .xml_parser import load_xml
 from .schema_inferer import infer_type
-from collections import Counter
+
+
+def string_type(text):
+    """
+    Types any text as xs:string; the counterpart of infer_type when typestrict is off.
+
+    Parameters:
+    - text (str): Text content of an XML element or attribute.
+
+    Returns:
+    - str: Always "xs:string".
+    """
+    return "xs:string"
 
 
 class XSDGenerator:
     def __init__(self):
-        self.ns_map = {"xs": "http://www.w3.org/2001/XMLSchema"}
-        self.xsd = None
-        self.processed_elements = set()  # Track processed elements
-        self.repeated_elements = set()  # Track elements that occur multiple times
+        self._local_names = {}  # Namespace-stripped names by qualified tag, safe to share
         self.typestrict = False  # Flag to control type inference
+        self.minify = False  # Flag to replace element names with short generated names
+        self.pretty = False  # Flag to indent the schema for reading
 
-    def generate_xsd(self, xml_path):
+    def generate_xsd(self, xml_path, name_map=None):
         """
         Generates an XSD schema for the given XML file.
 
+        The XML is streamed with iterparse in a single pass; every element is
+        cleared once it has been processed, so memory stays proportional to the
+        depth of the document rather than its size.
+
+        Every element name gets one named global complex type, referenced from
+        each parent it occurs in. Children and attributes seen in any occurrence
+        are merged into that type, so the schema grows with the number of
+        distinct element names rather than the number of elements.
+
+        All state of a run is kept in a per-call state object, so one generator
+        can be shared by threads generating schemas for different files.
+
         Parameters:
         - xml_path (str): Path to the XML file.
+        - name_map (dict): Receives the short name of each element name when minify is set.
+
+        Returns:
+        - bytes: The UTF-8 encoded XSD schema, or None if the XML could not be parsed.
+        """
+        state = SimpleNamespace(
+            root_name=None,
+            types={},  # Type records by element name, shared by all occurrences
+            type_of=infer_type if self.typestrict else string_type,
+        )
+        stack = [None]  # Frames of the open elements; None stands in for the root's parent
+        # Bind the per-event calls to locals, the loop runs twice per element
+        push, pop = stack.append, stack.pop
+        start_element, end_element = self.start_element, self.end_element
+        # The pass allocates a frame per element but creates no reference cycles,
+        # so the cyclic garbage collector would only rescan them
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for event, element in etree.iterparse(xml_path, events=("start", "end"), huge_tree=True):
+                if event == "start":
+                    push(start_element(state, element, stack[-1]))
+                else:
+                    end_element(state, element, pop())
+                    # Release the element and its finished siblings; the root has no
+                    # parent, and comments or PIs before it must not be pruned
+                    element.clear(keep_tail=True)
+                    parent = element.getparent()
+                    if parent is not None:
+                        while element.getprevious() is not None:
+                            del parent[0]
+        except (etree.XMLSyntaxError, OSError) as e:
+            print(f"Failed to load or parse XML file: {e}")
+            return None
+        finally:
+            if gc_enabled:
+                gc.enable()
+        return self.write_schema(state, name_map)
+
+    def start_element(self, state, element, parent_frame):
         """
-        xml_tree = load_xml(xml_path)
-        if xml_tree is not None:
-            # Detect repeated elements
-            self.repeated_elements = self.find_repeated_elements(xml_tree.getroot())
+        Handles the start of an XML element while streaming.
+
+        Declares the element in its parent's type on its first occurrence there
+        and counts it to detect repetitions under the same parent.
+
+        Parameters:
+        - state (SimpleNamespace): The state of the current generate_xsd call.
+        - element (etree.Element): The XML element that has just been opened.
+        - parent_frame (dict): The frame of the enclosing element, or None for the root.
 
-            self.xsd = etree.Element("{http://www.w3.org/2001/XMLSchema}schema", nsmap=self.ns_map)
-            self.process_element(xml_tree.getroot(), self.xsd, is_root=True)
-            return etree.tostring(self.xsd, pretty_print=True).decode()
+        Returns:
+        - dict: The frame tracking this element until its end.
+        """
+        element_name = self._local_name(element.tag)
+        frame = {"counts": None, "record": None}
+
+        if parent_frame is None:
+            state.root_name = element_name
         else:
-            return "Failed to generate XSD schema."
+            parent_record = parent_frame["record"]
+            if parent_record is None:
+                return frame  # The enclosing element's children are not described
+            if not parent_record["decided"]:
+                self.open_content(state, parent_record, element.getparent())
+            if parent_record["content"] != "sequence":
+                return frame
+
+            # Track elements that occur multiple times under the same parent
+            counts = parent_frame["counts"]
+            if counts is None:
+                # Only elements that turn out to have children get a counter
+                counts = parent_frame["counts"] = {}
+            count = counts[element_name] = counts.get(element_name, 0) + 1
 
-    def find_repeated_elements(self, root):
+            children = parent_record["children"]
+            if element_name not in children:
+                children[element_name] = False  # Whether it repeats under the same parent
+            elif count == 2:
+                children[element_name] = True
+
+        record = state.types.get(element_name)
+        if record is None:
+            record = state.types[element_name] = {
+                "name": element_name,
+                "decided": False,  # Whether the type is known yet
+                "type": None,
+                "content": None,  # "sequence" or "simple" for complex types
+                "attributes": {},  # Attribute types by name
+                "foreign_attributes": False,  # Whether namespaced attributes occur
+                "children": {},  # Repetition flags of child elements by name
+            }
+        elif record["decided"]:
+            self.add_attributes(state, record, element)
+        frame["record"] = record
+        return frame
+
+    def _local_name(self, tag):
         """
-        Identifies elements that occur multiple times under the same parent in the XML structure.
+        Returns the tag name without its namespace, caching the result per tag.
 
         Parameters:
-        - root (etree.Element): The root element of the XML tree.
+        - tag (str): The qualified tag, e.g. "{http://example.com}item".
 
         Returns:
-        - set: A set of element names that occur multiple times under the same parent.
+        - str: The local name, e.g. "item".
         """
-        repeated_elements = set()
-        self._count_elements(root, repeated_elements)
-        return repeated_elements
+        name = self._local_names.get(tag)
+        if name is None:
+            name = self._local_names[tag] = tag.rpartition('}')[2]
+        return name
 
-    def _count_elements(self, element, repeated_elements):
+    def open_content(self, state, record, element):
         """
-        Recursively counts occurrences of each element under the same parent in the XML tree.
+        Makes an element name a named complex type on its first occurrence.
 
         Parameters:
-        - element (etree.Element): The current XML element.
-        - repeated_elements (set): A set to track elements that occur multiple times under the same parent.
+        - state (SimpleNamespace): The state of the current generate_xsd call.
+        - record (dict): The type record of the element name.
+        - element (etree.Element): The XML element, with its leading text already parsed.
         """
-        child_names = [child.tag.split('}')[-1] for child in element]
-        for name, count in Counter(child_names).items():
-            if count > 1:
-                repeated_elements.add(name)
-        for child in element:
-            self._count_elements(child, repeated_elements)
+        if element.text and element.text.strip():
+            # Use simpleContent if the element has text; its children are not described
+            record["content"] = "simple"
+        else:
+            # Use sequence for child elements
+            record["content"] = "sequence"
+        record["decided"] = True
+        record["type"] = f"{record['name']}Type"
+        self.add_attributes(state, record, element)
 
-    def process_element(self, element, parent, min_occurs="0", is_root=False):
+    def end_element(self, state, element, frame):
         """
-        Recursively processes an XML element to generate its XSD representation.
+        Decides the type of an element without children once its content has been parsed.
 
         Parameters:
-        - element (etree.Element): The current XML element.
-        - parent (etree.Element): The parent element in the XSD schema.
-        - min_occurs (str): The minOccurs value for the element.
-        - is_root (bool): Whether the current element is the root element.
+        - state (SimpleNamespace): The state of the current generate_xsd call.
+        - element (etree.Element): The XML element that has just been closed.
+        - frame (dict): The frame returned by start_element for this element.
         """
-        ns = "{http://www.w3.org/2001/XMLSchema}"
-        element_name = element.tag.split('}')[-1]
+        record = frame["record"]
+        if record is None or record["decided"]:
+            return
 
-        # Skip if the element is already processed
-        if element_name in self.processed_elements:
+        if len(element.attrib) > 0:
+            self.open_content(state, record, element)
             return
-        self.processed_elements.add(element_name)
-
-        # Determine maxOccurs logic based on repeated elements at the same level
-        max_occurs = "unbounded" if element_name in self.repeated_elements else "1"
-
-        # Create the element definition
-        element_def = etree.SubElement(parent, f"{ns}element", name=element_name)
-        if not is_root:
-            element_def.set("minOccurs", min_occurs)
-        if max_occurs != "1":
-            element_def.set("maxOccurs", max_occurs)
-
-        has_children = len(element) > 0
-        has_attributes = len(element.attrib) > 0
-        has_text = element.text and element.text.strip()
-
-        if has_children or has_attributes:
-            complex_type = etree.SubElement(element_def, f"{ns}complexType")
-            if has_text:
-                # Use simpleContent if the element has both text and attributes
-                simple_content = etree.SubElement(complex_type, f"{ns}simpleContent")
-                extension = etree.SubElement(simple_content, f"{ns}extension", base="xs:string")
-                for attr_name, attr_value in element.attrib.items():
-                    attr_type = infer_type(attr_value) if self.typestrict else "xs:string"
-                    etree.SubElement(extension, f"{ns}attribute", name=attr_name, type=attr_type)
-            else:
-                # Use sequence for child elements
-                sequence = etree.SubElement(complex_type, f"{ns}sequence")
-                for child in element:
-                    self.process_element(child, sequence, min_occurs)
-                for attr_name, attr_value in element.attrib.items():
-                    attr_type = infer_type(attr_value) if self.typestrict else "xs:string"
-                    etree.SubElement(complex_type, f"{ns}attribute", name=attr_name, type=attr_type)
-        elif has_text:
+        record["decided"] = True
+        if element.text and element.text.strip():
             # If the element only has text, set its type directly
-            element_def.set("type", infer_type(element.text) if self.typestrict else "xs:string")
+            record["type"] = state.type_of(element.text)
+
+    def add_attributes(self, state, record, element):
+        """
+        Records attributes of an XML element not yet declared in its complex type.
+
+        Namespaced attributes (e.g. xml:lang) cannot be declared in a schema without
+        a target namespace; they are only noted, and allowed through xs:anyAttribute.
+
+        Parameters:
+        - state (SimpleNamespace): The state of the current generate_xsd call.
+        - record (dict): The type record of the element name.
+        - element (etree.Element): The XML element.
+        """
+        attrib = element.attrib
+        if record["content"] is None or not attrib:
+            return
+        attributes = record["attributes"]
+        type_of = state.type_of
+        # Values are only read for attributes not declared yet
+        for attr_name in attrib.keys():
+            if attr_name.startswith('{'):
+                record["foreign_attributes"] = True
+            elif attr_name not in attributes:
+                attributes[attr_name] = type_of(attrib[attr_name])
+
+    def write_schema(self, state, name_map=None):
+        """
+        Serializes the collected types as an XSD document.
+
+        The schema is written directly as text, with names escaped as attribute
+        values. With minify set, element names are replaced by short
+        generated names, which also serve as the names of their complex types.
+        The schema is compact unless pretty is set.
+
+        Parameters:
+        - state (SimpleNamespace): The state of the current generate_xsd call.
+        - name_map (dict): Receives the short name of each element name when minify is set.
+
+        Returns:
+        - bytes: The UTF-8 encoded XSD schema.
+        """
+        types = state.types
+        if self.minify:
+            names = dict(zip(types, self._short_names()))
+            if name_map is not None:
+                name_map.update(names)
+        else:
+            names = {name: name for name in types}
+
+        def type_name(record):
+            if self.minify and record["content"] is not None:
+                return names[record["name"]]
+            return record["type"]
+
+        lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema">']
+        lines.append(self._element_line("  ", names[state.root_name], type_name(types[state.root_name])))
+        for record in types.values():
+            if record["content"] is None:
+                continue
+            lines.append(f'  <xs:complexType name={quoteattr(type_name(record))}>')
+            attribute_indent = "        " if record["content"] == "simple" else "    "
+            attribute_lines = [
+                f'{attribute_indent}<xs:attribute name={quoteattr(name)} type={quoteattr(attr_type)}/>'
+                for name, attr_type in record["attributes"].items()
+            ]
+            if record["foreign_attributes"]:
+                attribute_lines.append(f'{attribute_indent}<xs:anyAttribute namespace="##other" processContents="skip"/>')
+            if record["content"] == "simple":
+                lines.append('    <xs:simpleContent>')
+                if attribute_lines:
+                    lines.append('      <xs:extension base="xs:string">')
+                    lines.extend(attribute_lines)
+                    lines.append('      </xs:extension>')
+                else:
+                    lines.append('      <xs:extension base="xs:string"/>')
+                lines.append('    </xs:simpleContent>')
+            else:
+                if record["children"]:
+                    lines.append('    <xs:sequence>')
+                    for name, repeated in record["children"].items():
+                        lines.append(self._element_line("      ", names[name], type_name(types[name]), repeated))
+                    lines.append('    </xs:sequence>')
+                else:
+                    lines.append('    <xs:sequence/>')
+                lines.extend(attribute_lines)
+            lines.append('  </xs:complexType>')
+        lines.append('</xs:schema>')
+        if self.pretty:
+            lines.append('')
+            return "\n".join(lines).encode("utf-8")
+        return "".join(line.lstrip(" ") for line in lines).encode("utf-8")
+
+    def _short_names(self):
+        """
+        Generates short names in base-26 order: a, b, ..., z, aa, ab, ...
+
+        Returns:
+        - generator: An endless sequence of names.
+        """
+        for number in count():
+            name = ""
+            number += 1
+            while number:
+                number, digit = divmod(number - 1, 26)
+                name = ascii_lowercase[digit] + name
+            yield name
+
+    def _element_line(self, indent, name, type_name, repeated=None):
+        """
+        Formats an element declaration; a repeated flag of None marks the root element.
+
+        Parameters:
+        - indent (str): Leading whitespace.
+        - name (str): The element name.
+        - type_name (str): The XSD type, or None for an untyped element.
+        - repeated (bool): Whether the element occurs multiple times under the same parent.
+
+        Returns:
+        - str: The xs:element line.
+        """
+        line = f'{indent}<xs:element name={quoteattr(name)}'
+        if repeated is not None:
+            line += ' minOccurs="0"'
+        if repeated:
+            line += ' maxOccurs="unbounded"'
+        if type_name is not None:
+            line += f' type={quoteattr(type_name)}'
+        return line + '/>'
 
 
 if __name__ == "__main__":
     generator = XSDGenerator()
+    generator.pretty = True
     xml_path = "tests/xml_files/valid_basic.xml"  # Update this path to your XML file.
     xsd_schema = generator.generate_xsd(xml_path)
     if xsd_schema:
         # print("XSD Schema Generated Successfully:")
-        print(xsd_schema)
+        print(xsd_schema.decode("utf-8"))
     else:
         print("Failed to generate XSD schema.")
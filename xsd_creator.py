@@ -1,38 +1,145 @@
+import io
+import json
 import os
+import re
+from contextlib import redirect_stdout
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from lxml import etree
 from xmlgen import XSDGenerator
 
 
-def create_xsd_from_xml(file, typestrict=False):
+def create_xsd_from_xml(file, typestrict=False, minify=False, name_map=None, pretty=False):
     """
     Create an XSD schema from an XML file.
 
     Parameters:
     - file (str): The path to the XML file to be converted to XSD.
     - typestrict (bool): If True, the generator will be strict about types. Default is False.
+    - minify (bool): If True, element names are replaced by short generated names. Default is False.
+    - name_map (dict): Receives the short name of each element name when minify is set.
+    - pretty (bool): If True, the schema is indented for reading. Default is False.
+
+    Returns:
+    - bytes: The UTF-8 encoded XSD schema, or None if the XML file could not be parsed.
     """
     generator = XSDGenerator()
     generator.typestrict = typestrict
-    xsd_schema = generator.generate_xsd(file)
+    generator.minify = minify
+    generator.pretty = pretty
+    xsd_schema = generator.generate_xsd(file, name_map)
     return xsd_schema
 
 
-def validate_xml_against_xsd(xmlfile, xsdfile) -> bool:
-    with open(xmlfile, 'rb') as file:
-        xml = file.read()
+def dictionary_path(xsdfile):
+    """
+    Return the path of the name dictionary belonging to a minified XSD schema.
+
+    Parameters:
+    - xsdfile (str): The path to the XSD file.
+
+    Returns:
+    - str: The path to the .dic.json file next to the XSD file.
+    """
+    return os.path.splitext(xsdfile)[0] + ".dic.json"
+
+
+def save_xsd(xsdfile, xsd_schema, name_map=None):
+    """
+    Write an XSD schema and, for a minified schema, its name dictionary.
+
+    Parameters:
+    - xsdfile (str): The path to the XSD file.
+    - xsd_schema (bytes): The UTF-8 encoded XSD schema.
+    - name_map (dict): The short name of each element name, or None for a schema with original names.
+    """
+    with open(xsdfile, "wb") as xsd_f:
+        xsd_f.write(xsd_schema)
+    dictionary = dictionary_path(xsdfile)
+    if name_map:
+        with open(dictionary, "w", encoding="utf-8") as dic_f:
+            json.dump(name_map, dic_f, indent=2)
+    elif os.path.exists(dictionary):
+        os.remove(dictionary)  # Left over from an earlier minified schema
 
+
+@lru_cache(maxsize=32)
+def load_schema(xsdfile, mtime_ns):
+    """
+    Parse and compile an XSD schema, caching the compiled schema.
+
+    Parameters:
+    - xsdfile (str): The path to the XSD file.
+    - mtime_ns (int): Modification time of the XSD file, so a rewritten file is compiled again.
+
+    Returns:
+    - etree.XMLSchema: The compiled schema.
+    """
     with open(xsdfile, 'rb') as xsd_file:
         xsd_doc = etree.parse(xsd_file)
-        xsd = etree.XMLSchema(xsd_doc)
+    return etree.XMLSchema(xsd_doc)
+
+
+def validate_xml_against_xsd(xmlfile, xsdfile) -> bool:
+    xsd = load_schema(xsdfile, os.stat(xsdfile).st_mtime_ns)
+
+    # Let libxml2 read the file itself instead of copying it into a bytes object first
+    parser = etree.XMLParser(huge_tree=True, collect_ids=False)
+    xml_doc = etree.parse(xmlfile, parser)
+
+    # A minified schema uses short element names; rename the document's elements to match
+    name_map = None
+    dictionary = dictionary_path(xsdfile)
+    if os.path.exists(dictionary):
+        with open(dictionary, encoding="utf-8") as dic_f:
+            name_map = json.load(dic_f)
+        for element in xml_doc.iter(tag=etree.Element):
+            namespace, _, name = element.tag.rpartition('}')
+            if name in name_map:
+                element.tag = f"{namespace}}}{name_map[name]}" if namespace else name_map[name]
 
-    xml_doc = etree.fromstring(xml)
     result = xsd.validate(xml_doc)
     if not result:
         print(f"Validation failed for {xmlfile}:")
-        print(xsd.error_log)  # Optional: Log der Validierungsfehler ausgeben
+        if name_map:
+            print(restore_element_names(xsd.error_log, name_map))
+        else:
+            print(xsd.error_log)  # Optional: Log der Validierungsfehler ausgeben
     return result
 
 
+def restore_element_names(error_log, name_map):
+    """
+    Format a validation error log with minified element names mapped back to the original names.
+
+    Parameters:
+    - error_log (etree._ListErrorLog): The error log of a validation against a minified schema.
+    - name_map (dict): The short name of each element name.
+
+    Returns:
+    - str: The error log in lxml's format, naming the elements as they appear in the XML file.
+    """
+    original_names = {short: name for name, short in name_map.items()}
+
+    def restore(name):
+        namespace, brace, short = name.strip().rpartition('}')
+        return namespace + brace + original_names.get(short, short)
+
+    def restore_list(match):
+        return f"{match.group(1)}( {', '.join(restore(name) for name in match.group(2).split(','))} )"
+
+    lines = []
+    for error in error_log:
+        # Element names appear quoted (Element 'b') and in lists of expected elements
+        # (Expected is one of ( a, b )); quoted values are left untouched
+        message = re.sub(r"Element '([^']+)'", lambda m: f"Element '{restore(m.group(1))}'", error.message)
+        message = re.sub(r"(Expected is (?:one of )?)\( ([^()]+) \)", restore_list, message)
+        lines.append(f"{error.filename}:{error.line}:{error.column}:{error.level_name}:"
+                     f"{error.domain_name}:{error.type_name}: {message}")
+    return "\n".join(lines)
+
+
 def list_xml_files(directory):
     """
     List all XML files in a given directory.
@@ -44,9 +151,10 @@ def list_xml_files(directory):
     - list: A list of XML file paths.
     """
     try:
-        files = [os.path.join(directory, f) for f in os.listdir(directory) if f.endswith('.xml')]
-        return files
-    except NotADirectoryError:
+        # DirEntry carries the name, path and file type, so no extra join or stat is needed
+        with os.scandir(directory) as entries:
+            return [entry.path for entry in entries if entry.name.endswith('.xml') and entry.is_file()]
+    except (FileNotFoundError, NotADirectoryError):
         print(f"Directory not found: {directory}")
         return []
 
@@ -64,6 +172,51 @@ def check_file_exists(file_path):
     return os.path.isfile(file_path)
 
 
+def process_xml_file(file, create, validate, typestrict, minify, pretty, xsd_dir):
+    """
+    Create and/or validate the XSD schema for a single XML file of a batch.
+
+    Runs in a worker process, so the output is captured and returned instead of
+    printed, keeping the messages of each file together.
+
+    Parameters:
+    - file (str): The path to the XML file.
+    - create (bool): Whether to create the XSD schema.
+    - validate (bool): Whether to validate the XML file against its XSD schema.
+    - typestrict (bool): If True, the generator will be strict about types.
+    - minify (bool): If True, element names are replaced by short generated names.
+    - pretty (bool): If True, the schema is indented for reading.
+    - xsd_dir (str): The directory holding the XSD schemas.
+
+    Returns:
+    - str: The output of the processing steps.
+    """
+    with redirect_stdout(io.StringIO()) as output:
+        try:
+            xsd_file = os.path.join(xsd_dir, os.path.basename(file).replace(".xml", "-scheme.xsd"))
+            if create:
+                print(f"Creating XSD for {file}...")
+                name_map = {}
+                xsd_schema = create_xsd_from_xml(file, typestrict, minify, name_map, pretty)
+                if xsd_schema is None:
+                    print(f"Failed to generate XSD schema for {file}")
+                    return output.getvalue()
+                save_xsd(xsd_file, xsd_schema, name_map)
+                print(f"XSD created: {xsd_file}")
+
+            if validate:
+                print(f"Validating {file} against its XSD...")
+                if not check_file_exists(xsd_file):
+                    print(f"XSD file not found: {xsd_file}")
+                    return output.getvalue()
+                res = validate_xml_against_xsd(file, xsd_file)
+                print(f"Validation result for {file}: {res}")
+        except Exception as e:
+            # lxml errors cannot be sent back from a worker process, so report them here
+            print(f"An error occurred while processing {file}: {e}")
+    return output.getvalue()
+
+
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(
@@ -82,6 +235,9 @@ if __name__ == "__main__":
     parser.add_argument('-f', '--file', type=str, help='Path to a specific XML file to process')
     parser.add_argument('-l', '--list', type=str, help='Process all XML files in the specified folder.')
     parser.add_argument('-t', '--typestrict', action='store_true', help='Enable strict type checking when creating XSD schemas.')
+    parser.add_argument('-m', '--minify', action='store_true', help='Replace element names with short names in created XSD schemas and store the mapping in a .dic.json file.')
+    parser.add_argument('-p', '--pretty', action='store_true', help='Indent created XSD schemas for reading instead of writing them compact.')
+    parser.add_argument('-j', '--jobs', type=int, help='Number of XML files processed in parallel with --list. Defaults to the number of CPUs.')
     args = parser.parse_args()
 
     # Ensure either --create or --validate is specified
@@ -93,6 +249,7 @@ if __name__ == "__main__":
         parser.error("You must specify a target: --file or --list.")
 
     typestrict = args.typestrict
+    minify = args.minify
     xml_file = args.file
     xml_list = args.list
     create = args.create
@@ -103,30 +260,16 @@ if __name__ == "__main__":
 
     try:
         if xml_list:
-            files = list_xml_files(xml_list)
+            files = sorted(list_xml_files(xml_list))  # Process in a stable order
             print(f"Start processing {len(files)} XML files...")
             print("-" * 40)
-            for f in files:
-                if not check_file_exists(f):
-                    print(f"File not found: {f}")
-                    continue
-                if create:
-                    print(f"Creating XSD for {f}...")
-                    xsd_schema = create_xsd_from_xml(f, typestrict)
-                    xsd_file = os.path.join(PATH_FOR_XSD, os.path.basename(f).replace(".xml", "-scheme.xsd"))
-                    with open(xsd_file, "w") as xsd_f:
-                        xsd_f.write(xsd_schema)
-                    print(f"XSD created: {xsd_file}")
-
-                if validate:
-                    print(f"Validating {f} against its XSD...")
-                    xsd_file = os.path.join(PATH_FOR_XSD, os.path.basename(f).replace(".xml", "-scheme.xsd"))
-                    if not check_file_exists(xsd_file):
-                        print(f"XSD file not found: {xsd_file}")
-                        continue
-                    res = validate_xml_against_xsd(f, xsd_file)
-                    print(f"Validation result for {f}: {res}")
-                print("-" * 40)
+            with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+                results = executor.map(process_xml_file, files, repeat(create), repeat(validate),
+                                       repeat(typestrict), repeat(minify), repeat(args.pretty),
+                                       repeat(PATH_FOR_XSD), chunksize=4)
+                for output in results:
+                    print(output, end="")
+                    print("-" * 40)
         if xml_file:
             file = xml_file
             if not check_file_exists(file):
@@ -134,10 +277,13 @@ if __name__ == "__main__":
                 exit(1)
             if create:
                 print(f"Creating XSD for {file}...")
-                xsd_schema = create_xsd_from_xml(file, typestrict)
+                name_map = {}
+                xsd_schema = create_xsd_from_xml(file, typestrict, minify, name_map, args.pretty)
+                if xsd_schema is None:
+                    print(f"Failed to generate XSD schema for {file}")
+                    exit(1)
                 xsd_file = os.path.join(PATH_FOR_XSD, os.path.basename(file).replace(".xml", "-scheme.xsd"))
-                with open(xsd_file, "w") as xsd_f:
-                    xsd_f.write(xsd_schema)
+                save_xsd(xsd_file, xsd_schema, name_map)
                 print(f"XSD created: {xsd_file}")
             if validate:
                 print(f"Validating {file} against its XSD...")